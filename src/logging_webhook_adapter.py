@@ -4,14 +4,29 @@ Custom Logging Gateway Adapter for SAM Webhook Gateway.
 This adapter wraps the webhook gateway functionality and adds prominent logging
 for all gateway events - incoming requests and Agent Mesh responses.
 
-Uses both logging module AND print statements with flush for guaranteed visibility.
+Records are handed to a background QueueListener that writes them to stdout, so
+the async adapter methods never block the event loop on terminal or pipe I/O.
+
+The output is opt-in: set MESHFLOW_VERBOSE_WEBHOOK_LOG=1 to enable it. When unset
+the adapter only builds SamTasks and logs errors, with no formatting overhead.
 """
 
+import atexit
+import itertools
 import logging
+import logging.handlers
 import json
+import os
+import queue
 import sys
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
 
+from solace_agent_mesh.common.a2a import create_text_part
 from solace_agent_mesh.gateway.adapter.base import GatewayAdapter
 from solace_agent_mesh.gateway.adapter.types import (
     GatewayContext,
@@ -22,6 +37,48 @@ from solace_agent_mesh.gateway.adapter.types import (
 
 log = logging.getLogger(__name__)
 
+
+class _RawStdoutHandler(logging.Handler):
+    """
+    Writes each record's message to stdout as UTF-8 bytes.
+
+    Skips the Formatter pass (QueueHandler has already rendered the message)
+    and the text-layer encode, writing straight to ``sys.stdout.buffer``.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            stream = sys.stdout
+            data = record.getMessage() + "\n"
+            buffer = getattr(stream, "buffer", None)
+            if buffer is None:
+                stream.write(data)
+                stream.flush()
+                return
+            # Push out anything print() left in the text layer to keep ordering
+            stream.flush()
+            buffer.write(data.encode("utf-8", "replace"))
+            buffer.flush()
+        except Exception:
+            self.handleError(record)
+
+
+# Verbose event output is opt-in so production meshes pay nothing for it
+_VERBOSE = os.environ.get("MESHFLOW_VERBOSE_WEBHOOK_LOG", "0") == "1"
+
+if _VERBOSE:
+    # Emit through a queue so the event loop only pays for a non-blocking put;
+    # the listener thread owns the (potentially slow) stdout writes.
+    _log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    log.addHandler(logging.handlers.QueueHandler(_log_queue))
+    if log.level == logging.NOTSET:
+        log.setLevel(logging.INFO)
+    _log_listener = logging.handlers.QueueListener(
+        _log_queue, _RawStdoutHandler(), respect_handler_level=True
+    )
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
 # Visual separator constants for prominent logging
 SEPARATOR_THICK = "=" * 80
 SEPARATOR_THIN = "-" * 80
@@ -29,24 +86,139 @@ ARROW_IN = ">" * 80
 ARROW_OUT = "<" * 80
 BANNER_START = "\n" + "#" * 80 + "\n" + "#" + " " * 30 + "GATEWAY EVENT" + " " * 35 + "#\n" + "#" * 80
 
+# Every decorated frame the adapter writes, rendered once at import
+_DECOR = {
+    'thick_open': "\n" + SEPARATOR_THICK,
+    'thick_close': SEPARATOR_THICK + "\n",
+    'thin_open': "\n" + SEPARATOR_THIN,
+    'header_in': "\n".join([
+        BANNER_START, "", SEPARATOR_THICK,
+        ARROW_IN, "    INCOMING WEBHOOK REQUEST RECEIVED", ARROW_IN, SEPARATOR_THIN,
+    ]),
+    'footer_in': "\n".join(["", ARROW_IN, SEPARATOR_THICK, ""]),
+    'header_out': "\n".join([
+        BANNER_START, "", SEPARATOR_THICK,
+        ARROW_OUT, "    AGENT MESH RESPONSE/UPDATE RECEIVED", ARROW_OUT, SEPARATOR_THIN,
+    ]),
+    'footer_out': "\n".join(["", ARROW_OUT, SEPARATOR_THICK, ""]),
+}
+
+# Update fields shown in the update details, probed once per update: SamUpdate's
+# own fields first, then the optional ones the sections below report on
+_UPDATE_FIELDS = ('parts', 'is_final', 'text', 'status', 'error', 'artifacts')
+_MISSING = object()
+
+
+if _VERBOSE:
+    def _log_and_print(message: str, level: str = "info") -> None:
+        """Log a message; the queue listener echoes it to stdout off the event loop."""
+        getattr(log, level)(message)
+else:
+    def _log_and_print(message: str, level: str = "info") -> None:
+        """Verbose webhook logging is disabled; drop the message."""
+
+
+def _dump_json(data: Any) -> str:
+    """Serialize a dict/list as 2-space indented JSON, falling back to str()."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                data,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+                default=str,
+            ).decode()
+        except Exception:
+            # e.g. ints wider than 64 bits, which the stdlib encoder handles
+            pass
+    try:
+        return json.dumps(data, indent=2, default=str)
+    except Exception:
+        return str(data)
 
-def _log_and_print(message: str, level: str = "info") -> None:
-    """Log and print a message for guaranteed visibility."""
-    print(message, flush=True)
-    sys.stdout.flush()
-    getattr(log, level)(message)
 
+def _format_task_text(data: Any) -> str:
+    """
+    Render webhook input as SamTask text.
 
-def _format_payload(data: Any, indent: int = 2) -> str:
-    """Format payload data for logging."""
+    Always uses the stdlib encoder so the text agents receive (ASCII escaping,
+    datetime rendering) does not depend on whether orjson is installed.
+    """
+    if isinstance(data, str):
+        return data
     try:
         if isinstance(data, (dict, list)):
-            return json.dumps(data, indent=indent, default=str)
+            return json.dumps(data, indent=2, default=str)
         return str(data)
     except Exception:
         return str(data)
 
 
+# Exact-type dispatch for the payload values that dominate webhook traffic
+_FORMATTERS: Dict[type, Callable[[Any], str]] = {
+    dict: _dump_json,
+    list: _dump_json,
+    str: str,
+    int: repr,
+    float: repr,
+    bool: repr,
+    type(None): repr,
+}
+
+
+def _format_payload(data: Any) -> str:
+    """Format payload data for logging (2-space indented JSON for dicts/lists)."""
+    formatter = _FORMATTERS.get(type(data))
+    if formatter is None:
+        # Subclasses (OrderedDict, str enums, ...) take the isinstance route
+        formatter = _dump_json if isinstance(data, (dict, list)) else str
+    return formatter(data)
+
+
+def _format_payload_capped(data: Any, cap: int) -> str:
+    """
+    Format payload data, truncated to ``cap`` characters.
+
+    A top-level dict/list with more than ``cap // 2`` items is cut down to its
+    first ``cap // 2`` items before serializing: every item takes well over
+    two characters of indented JSON, so the visible prefix is identical.
+    Only the top-level item count is capped; a large value nested inside one
+    of the kept items is still serialized in full. Raw byte buffers are
+    summarized instead of dumped.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return f"<{type(data).__name__}: {len(data)} bytes>"
+    truncated = False
+    if isinstance(data, dict) and len(data) > cap // 2:
+        data = dict(itertools.islice(data.items(), cap // 2))
+        truncated = True
+    elif isinstance(data, list) and len(data) > cap // 2:
+        data = data[:cap // 2]
+        truncated = True
+    text = _format_payload(data)
+    if truncated or len(text) > cap:
+        return text[:cap] + "... [TRUNCATED]"
+    return text
+
+
+class _EventLog:
+    """
+    Buffers the lines of one gateway event so they reach the log as a single
+    record (one stdout write) instead of one record per line.
+    """
+
+    def __init__(self, level: str = "info") -> None:
+        self.level = level
+        self._lines: List[str] = []
+
+    def write(self, message: str) -> None:
+        self._lines.append(message)
+
+    def flush(self) -> None:
+        if self._lines:
+            _log_and_print("\n".join(self._lines), self.level)
+            self._lines = []
+
+
 class LoggingWebhookAdapter(GatewayAdapter):
     """
     A gateway adapter that adds verbose logging for all webhook events.
@@ -56,16 +228,22 @@ class LoggingWebhookAdapter(GatewayAdapter):
     - Tasks being sent to the Agent Mesh
     - All updates/responses from the Agent Mesh
 
-    Uses both Python logging and print() for maximum visibility.
+    With MESHFLOW_VERBOSE_WEBHOOK_LOG=1, every line is also echoed to stdout by
+    a background listener for maximum visibility.
     """
 
     async def init(self, context: GatewayContext) -> None:
         """Initialize the logging adapter."""
         self.context = context
-        _log_and_print(f"\n{SEPARATOR_THICK}")
-        _log_and_print("    LOGGING WEBHOOK ADAPTER INITIALIZED")
-        _log_and_print(f"    Gateway ID: {getattr(context, 'gateway_id', 'unknown')}")
-        _log_and_print(f"{SEPARATOR_THICK}\n")
+        if not _VERBOSE:
+            return
+
+        event = _EventLog()
+        event.write(_DECOR['thick_open'])
+        event.write("    LOGGING WEBHOOK ADAPTER INITIALIZED")
+        event.write(f"    Gateway ID: {getattr(context, 'gateway_id', 'unknown')}")
+        event.write(_DECOR['thick_close'])
+        event.flush()
 
     async def prepare_task(
         self, external_input: Any, endpoint_context: Optional[Dict[str, Any]] = None
@@ -75,42 +253,39 @@ class LoggingWebhookAdapter(GatewayAdapter):
 
         This method is called when a webhook request is received.
         """
-        _log_and_print(BANNER_START)
-        _log_and_print(f"\n{SEPARATOR_THICK}")
-        _log_and_print(f"{ARROW_IN}")
-        _log_and_print("    INCOMING WEBHOOK REQUEST RECEIVED")
-        _log_and_print(f"{ARROW_IN}")
-        _log_and_print(f"{SEPARATOR_THIN}")
-
-        # Log endpoint context
-        if endpoint_context:
-            _log_and_print("\n    ENDPOINT CONTEXT:")
-            _log_and_print(_format_payload(endpoint_context))
-            _log_and_print(f"{SEPARATOR_THIN}")
-
-        # Log the raw external input
-        _log_and_print("\n    RAW EXTERNAL INPUT PAYLOAD:")
-        _log_and_print(f"{SEPARATOR_THIN}")
-        _log_and_print(_format_payload(external_input))
-        _log_and_print(f"{SEPARATOR_THIN}")
-
-        # Extract payload details if possible
-        if isinstance(external_input, dict):
-            _log_and_print("\n    PAYLOAD BREAKDOWN:")
-            for key, value in external_input.items():
-                formatted_val = _format_payload(value)
-                if len(formatted_val) > 500:
-                    formatted_val = formatted_val[:500] + "... [TRUNCATED]"
-                _log_and_print(f"      {key}: {formatted_val}")
-
-        _log_and_print(f"\n{ARROW_IN}")
-        _log_and_print(f"{SEPARATOR_THICK}\n")
+        # Skip all event formatting when verbose output is off or filtered anyway
+        verbose = _VERBOSE and log.isEnabledFor(logging.INFO)
+
+        if verbose:
+            event = _EventLog()
+            event.write(_DECOR['header_in'])
+
+            # Log endpoint context
+            if endpoint_context:
+                event.write("\n    ENDPOINT CONTEXT:")
+                event.write(_format_payload(endpoint_context))
+                event.write(SEPARATOR_THIN)
+
+            # Log the raw external input
+            event.write("\n    RAW EXTERNAL INPUT PAYLOAD:")
+            event.write(SEPARATOR_THIN)
+            event.write(_format_payload(external_input))
+            event.write(SEPARATOR_THIN)
+
+            # Extract payload details if possible
+            if isinstance(external_input, dict):
+                event.write("\n    PAYLOAD BREAKDOWN:")
+                event.write("\n".join(
+                    f"      {key}: {_format_payload_capped(value, 500)}"
+                    for key, value in external_input.items()
+                ))
+
+            event.write(_DECOR['footer_in'])
+            event.flush()
 
         # Create the SamTask - this is where you'd normally transform the input
         # For the webhook gateway, we create a simple text task
-        task_text = external_input if isinstance(external_input, str) else _format_payload(external_input)
-
-        from solace_agent_mesh.common.a2a import create_text_part
+        task_text = _format_task_text(external_input)
 
         task = SamTask(
             target_agent="OrchestratorAgent",
@@ -118,11 +293,14 @@ class LoggingWebhookAdapter(GatewayAdapter):
             metadata={"source": "logging_webhook_adapter"}
         )
 
-        _log_and_print(f"\n{SEPARATOR_THIN}")
-        _log_and_print("    PREPARED SAM TASK:")
-        _log_and_print(f"      Target Agent: {task.target_agent}")
-        _log_and_print(f"      Content Parts: {len(task.content)}")
-        _log_and_print(f"{SEPARATOR_THIN}\n")
+        if verbose:
+            _log_and_print(
+                f"\n{SEPARATOR_THIN}\n"
+                "    PREPARED SAM TASK:\n"
+                f"      Target Agent: {task.target_agent}\n"
+                f"      Content Parts: {len(task.content)}\n"
+                f"{SEPARATOR_THIN}\n"
+            )
 
         return task
 
@@ -134,82 +312,108 @@ class LoggingWebhookAdapter(GatewayAdapter):
 
         This method is called for each update/response from agents.
         """
-        _log_and_print(BANNER_START)
-        _log_and_print(f"\n{SEPARATOR_THICK}")
-        _log_and_print(f"{ARROW_OUT}")
-        _log_and_print("    AGENT MESH RESPONSE/UPDATE RECEIVED")
-        _log_and_print(f"{ARROW_OUT}")
-        _log_and_print(f"{SEPARATOR_THIN}")
+        # Nothing here but logging; skip formatting the update if it would be dropped
+        if not (_VERBOSE and log.isEnabledFor(logging.INFO)):
+            return
+
+        session_id = getattr(context, 'session_id', 'N/A')
+        task_id = getattr(context, 'task_id', 'N/A')
+        user_id = getattr(context, 'user_id', 'N/A')
+
+        event = _EventLog()
+        event.write(_DECOR['header_out'])
 
         # Log update type and status
         update_type = type(update).__name__
-        _log_and_print(f"\n    UPDATE TYPE: {update_type}")
+        event.write(f"\n    UPDATE TYPE: {update_type}")
 
         # Log response context
-        _log_and_print(f"\n    RESPONSE CONTEXT:")
-        _log_and_print(f"      Session ID: {getattr(context, 'session_id', 'N/A')}")
-        _log_and_print(f"      Task ID: {getattr(context, 'task_id', 'N/A')}")
-        _log_and_print(f"      User ID: {getattr(context, 'user_id', 'N/A')}")
-
-        _log_and_print(f"\n{SEPARATOR_THIN}")
-        _log_and_print("    UPDATE DETAILS:")
-
-        # Log the full update object
-        if hasattr(update, '__dict__'):
-            for attr_name, attr_value in vars(update).items():
-                if not attr_name.startswith('_'):
-                    formatted_value = _format_payload(attr_value)
-                    # Truncate very long values but show them
-                    if len(formatted_value) > 2000:
-                        _log_and_print(f"      {attr_name} (truncated):")
-                        _log_and_print(f"        {formatted_value[:2000]}...")
-                        _log_and_print(f"        [Total length: {len(formatted_value)} chars]")
-                    else:
-                        _log_and_print(f"      {attr_name}:")
-                        _log_and_print(f"        {formatted_value}")
+        event.write("\n    RESPONSE CONTEXT:")
+        event.write(
+            f"      Session ID: {session_id}\n"
+            f"      Task ID: {task_id}\n"
+            f"      User ID: {user_id}"
+        )
+
+        event.write(_DECOR['thin_open'])
+        event.write("    UPDATE DETAILS:")
+
+        # Log the known update fields in a single pass
+        fields: Dict[str, Any] = {}
+        for attr_name in _UPDATE_FIELDS:
+            attr_value = getattr(update, attr_name, _MISSING)
+            if attr_value is not _MISSING:
+                fields[attr_name] = attr_value
+        if fields:
+            # Truncate very long values but show them
+            event.write("\n".join(
+                f"      {attr_name}:\n        {_format_payload_capped(attr_value, 2000)}"
+                for attr_name, attr_value in fields.items()
+            ))
         else:
-            _log_and_print(f"      Raw Update: {_format_payload(update)}")
+            event.write(f"      Raw Update: {_format_payload_capped(update, 2000)}")
 
         # Check for specific update types and log accordingly
-        if hasattr(update, 'text') and update.text:
-            _log_and_print(f"\n{SEPARATOR_THIN}")
-            _log_and_print("    TEXT CONTENT:")
-            _log_and_print(f"      {update.text}")
-
-        if hasattr(update, 'status') and update.status:
-            _log_and_print(f"\n{SEPARATOR_THIN}")
-            _log_and_print(f"    STATUS: {update.status}")
-
-        if hasattr(update, 'error') and update.error:
-            _log_and_print(f"\n{SEPARATOR_THIN}")
-            _log_and_print(f"    ERROR: {update.error}")
-
-        if hasattr(update, 'artifacts') and update.artifacts:
-            _log_and_print(f"\n{SEPARATOR_THIN}")
-            _log_and_print("    ARTIFACTS:")
-            for artifact in update.artifacts:
-                _log_and_print(f"      - {_format_payload(artifact)}")
-
-        _log_and_print(f"\n{ARROW_OUT}")
-        _log_and_print(f"{SEPARATOR_THICK}\n")
+        text = fields.get('text')
+        if text:
+            event.write(_DECOR['thin_open'])
+            event.write("    TEXT CONTENT:")
+            event.write(f"      {text}")
+
+        status = fields.get('status')
+        if status:
+            event.write(_DECOR['thin_open'])
+            event.write(f"    STATUS: {status}")
+
+        error = fields.get('error')
+        if error:
+            event.write(_DECOR['thin_open'])
+            event.write(f"    ERROR: {error}")
+
+        artifacts = fields.get('artifacts')
+        if artifacts:
+            event.write(_DECOR['thin_open'])
+            event.write("    ARTIFACTS:")
+            event.write("\n".join(f"      - {_format_payload(artifact)}" for artifact in artifacts))
+
+        event.write(_DECOR['footer_out'])
+        event.flush()
 
     async def on_task_complete(self, context: ResponseContext) -> None:
         """Called when a task is fully complete."""
-        _log_and_print(f"\n{SEPARATOR_THICK}")
-        _log_and_print("    TASK COMPLETED")
-        _log_and_print(f"      Session ID: {getattr(context, 'session_id', 'N/A')}")
-        _log_and_print(f"      Task ID: {getattr(context, 'task_id', 'N/A')}")
-        _log_and_print(f"{SEPARATOR_THICK}\n")
+        if not _VERBOSE:
+            return
+
+        session_id = getattr(context, 'session_id', 'N/A')
+        task_id = getattr(context, 'task_id', 'N/A')
+
+        event = _EventLog()
+        event.write(_DECOR['thick_open'])
+        event.write("    TASK COMPLETED")
+        event.write(f"      Session ID: {session_id}\n      Task ID: {task_id}")
+        event.write(_DECOR['thick_close'])
+        event.flush()
 
     async def on_error(self, error: Exception, context: Optional[ResponseContext] = None) -> None:
         """Handle errors with verbose logging."""
-        _log_and_print(f"\n{SEPARATOR_THICK}", "error")
-        _log_and_print("    ERROR IN GATEWAY PROCESSING", "error")
-        _log_and_print(f"{SEPARATOR_THIN}", "error")
-        _log_and_print(f"    Error Type: {type(error).__name__}", "error")
-        _log_and_print(f"    Error Message: {str(error)}", "error")
-        if context:
-            _log_and_print(f"    Context Session ID: {getattr(context, 'session_id', 'N/A')}", "error")
-            _log_and_print(f"    Context Task ID: {getattr(context, 'task_id', 'N/A')}", "error")
-        _log_and_print(f"{SEPARATOR_THICK}\n", "error")
-        log.error("Full traceback:", exc_info=True)
+        session_id = getattr(context, 'session_id', 'N/A')
+        task_id = getattr(context, 'task_id', 'N/A')
+
+        if _VERBOSE:
+            event = _EventLog("error")
+            event.write(_DECOR['thick_open'])
+            event.write("    ERROR IN GATEWAY PROCESSING")
+            event.write(SEPARATOR_THIN)
+            event.write(f"    Error Type: {type(error).__name__}")
+            event.write(f"    Error Message: {str(error)}")
+            if context:
+                event.write(f"    Context Session ID: {session_id}\n    Context Task ID: {task_id}")
+            event.write(_DECOR['thick_close'])
+            event.flush()
+
+        # Errors are always logged, with or without the verbose banner
+        log.error(
+            "Gateway error %s: %s (session=%s task=%s)",
+            type(error).__name__, error, session_id, task_id,
+            exc_info=error,
+        )